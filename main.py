@@ -3,6 +3,7 @@ import sys
 from src.config import carregar_config
 from src.load_balance import LoadBalancer
 from src.source import Source
+from src.source_coordinator import SourceCoordinator, run_source_worker
 from src.service import Service
 
 def iniciar_source(config=None):
@@ -21,10 +22,39 @@ def iniciar_source(config=None):
     print("=== Iniciando etapa de validação ===")
     config_validacao = config.copy()
     config_validacao["model_feeding_stage"] = False
-    source_validacao = Source(config_validacao)
+    if config.get("source_workers", 1) > 1 or config.get("source_worker_addresses"):
+        # Validação distribuída entre vários processos/hosts de Source
+        source_validacao = SourceCoordinator(config_validacao)
+    else:
+        source_validacao = Source(config_validacao)
     source_validacao.run()
 
-def iniciar_load_balancer(listen_port=2000, service_addresses=None):
+def iniciar_replay(trace_path, speedup=1.0, config=None):
+    if config is None:
+        config = carregar_config()
+
+    # O replay substitui a etapa de validação; não há etapa de alimentação do modelo
+    config_replay = config.copy()
+    config_replay["model_feeding_stage"] = False
+    config_replay["trace_replay"] = trace_path
+    config_replay["trace_speedup"] = speedup
+    Source(config_replay).run()
+
+def iniciar_simulacao(samples_file=None, replications=None, config=None):
+    # Importado aqui para que os demais papéis não dependam do NumPy
+    from src.simulator import TopologySimulator
+
+    if config is None:
+        config = carregar_config()
+
+    config_simulacao = config.copy()
+    if samples_file:
+        config_simulacao["simulation_samples_file"] = samples_file
+    if replications:
+        config_simulacao["simulation_replications"] = replications
+    TopologySimulator(config_simulacao).run()
+
+def iniciar_load_balancer(listen_port=2000, service_addresses=None, passthrough=False, passthrough_timestamps=False):
     if service_addresses is None or not service_addresses: # Adicionado 'not service_addresses'
         # Este caminho só deve ser tomado se explicitamente nenhum endereço for fornecido E você quiser um default.
         # Dado o docker-compose, service_addresses NUNCA deveria ser None aqui.
@@ -35,11 +65,13 @@ def iniciar_load_balancer(listen_port=2000, service_addresses=None):
              print(f"ERRO: Load balancer na porta {listen_port} recebeu uma lista vazia de servicos.")
              sys.exit(1) # Ou trate como o LoadBalancer deve se comportar sem backends
 
-    lb = LoadBalancer(listen_port=listen_port, service_addresses=service_addresses)
+    lb = LoadBalancer(listen_port=listen_port, service_addresses=service_addresses,
+                      passthrough=passthrough, passthrough_timestamps=passthrough_timestamps)
     lb.start()
 
-def iniciar_service(port, service_time_ms):
-    service = Service(listen_port=port, service_time_ms=service_time_ms)
+def iniciar_service(port, service_time_ms, batch_window_ms=0.0, max_batch_size=8):
+    service = Service(listen_port=port, service_time_ms=service_time_ms,
+                      batch_window_ms=batch_window_ms, max_batch_size=max_batch_size)
     service.start()
 
 if __name__ == "__main__":
@@ -53,10 +85,52 @@ if __name__ == "__main__":
         print("Iniciando Source")
         iniciar_source()
 
+    elif role == "source_replay":
+        if len(sys.argv) < 3: # Espera: python main.py source_replay <trace_path> [speedup]
+            print(f"Erro: Parametros invalidos para source_replay.")
+            print(f"Esperado: python main.py source_replay <trace_path> [speedup]")
+            sys.exit(1)
+        try:
+            speedup = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+        except ValueError:
+            print(f"Erro: speedup ('{sys.argv[3]}') invalido para source_replay.")
+            sys.exit(1)
+        if speedup <= 0:
+            print(f"Erro: speedup deve ser maior que zero.")
+            sys.exit(1)
+
+        print(f"Iniciando replay do trace {sys.argv[2]} com aceleracao de {speedup}x")
+        iniciar_replay(sys.argv[2], speedup)
+
+    elif role == "simulate": # Espera: python main.py simulate [samples_file] [replications]
+        samples_file = sys.argv[2] if len(sys.argv) > 2 else None
+        try:
+            replications = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        except ValueError:
+            print(f"Erro: replications ('{sys.argv[3]}') invalido para simulate.")
+            sys.exit(1)
+
+        print("Iniciando simulacao da topologia")
+        iniciar_simulacao(samples_file, replications)
+
+    elif role == "source_worker":
+        if len(sys.argv) < 3: # Espera: python main.py source_worker <port>
+            print(f"Erro: Parametros invalidos para source_worker.")
+            print(f"Esperado: python main.py source_worker <port>")
+            sys.exit(1)
+        try:
+            port = int(sys.argv[2])
+        except ValueError:
+            print(f"Erro: port ('{sys.argv[2]}') invalido para source_worker.")
+            sys.exit(1)
+
+        print(f"Iniciando worker de Source na porta {port}")
+        run_source_worker(port)
+
     elif role == "load_balancer":
-        if len(sys.argv) < 4: # Espera: python main.py load_balancer <listen_port> "<ip1>:<port1>,<ip2>:<port2>,..."
+        if len(sys.argv) < 4: # Espera: python main.py load_balancer <listen_port> "<ip1>:<port1>,<ip2>:<port2>,..." [passthrough] [timestamps]
             print(f"Erro: Parametros invalidos para load_balancer.")
-            print(f"Esperado: python main.py load_balancer <listen_port> \"ip1:port1,ip2:port2,...\"")
+            print(f"Esperado: python main.py load_balancer <listen_port> \"ip1:port1,ip2:port2,...\" [passthrough] [timestamps]")
             sys.exit(1)
 
         try:
@@ -90,16 +164,23 @@ if __name__ == "__main__":
             print(f"Erro: Nenhum endereco de servico valido foi parseado de '{service_addresses_str}' para o load_balancer.")
             sys.exit(1)
 
+        # Flags opcionais: 'passthrough' ativa o repasse L4 de bytes e 'timestamps'
+        # mantém o timestamp de chegada do LB na mensagem nesse modo
+        lb_flags = [flag.lower() for flag in sys.argv[4:]]
+        passthrough = "passthrough" in lb_flags
+        passthrough_timestamps = "timestamps" in lb_flags
+
         # Se chegou aqui, o parsing foi bem-sucedido
-        print(f"Iniciando Load_Balancer na porta {listen_port} com servicos: {parsed_service_addresses}")
+        print(f"Iniciando Load_Balancer na porta {listen_port} com servicos: {parsed_service_addresses} (passthrough={passthrough})")
         # Certifique-se que iniciar_load_balancer use esses enderecos parseados
         # e não o default 'localhost' que está na assinatura da função.
-        iniciar_load_balancer(listen_port=listen_port, service_addresses=parsed_service_addresses)
+        iniciar_load_balancer(listen_port=listen_port, service_addresses=parsed_service_addresses,
+                              passthrough=passthrough, passthrough_timestamps=passthrough_timestamps)
 
     elif role == "service":
-        if len(sys.argv) < 4: # Espera: python main.py service <port> <service_time_ms>
+        if len(sys.argv) < 4: # Espera: python main.py service <port> <service_time_ms> [batch_window_ms] [max_batch_size]
             print(f"Erro: Parametros invalidos para service.")
-            print(f"Esperado: python main.py service <port> <service_time_ms>")
+            print(f"Esperado: python main.py service <port> <service_time_ms> [batch_window_ms] [max_batch_size]")
             sys.exit(1)
         try:
             port = int(sys.argv[2])
@@ -108,5 +189,13 @@ if __name__ == "__main__":
             print(f"Erro: port ('{sys.argv[2]}') ou service_time_ms ('{sys.argv[3]}') invalidos para service.")
             sys.exit(1)
 
-        print(f"Iniciando servico na porta {port} com tempo de servico {service_time_ms}ms")
-        iniciar_service(port, service_time_ms)
+        try:
+            batch_window_ms = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+            max_batch_size = int(sys.argv[5]) if len(sys.argv) > 5 else 8
+        except ValueError:
+            print(f"Erro: batch_window_ms ou max_batch_size invalidos para service.")
+            sys.exit(1)
+
+        print(f"Iniciando servico na porta {port} com tempo de servico {service_time_ms}ms "
+              f"(lote: janela {batch_window_ms}ms, maximo {max_batch_size} prompts)")
+        iniciar_service(port, service_time_ms, batch_window_ms, max_batch_size)
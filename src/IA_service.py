@@ -2,11 +2,13 @@ from decouple import config
 from groq import Groq, RateLimitError, APIConnectionError, APIStatusError
 import time
 import random # Para adicionar jitter ao delay
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
 
 GROQ_API_KEY = config("GROQ_API_KEY", default=None)
 
 class IAService:
-    def __init__(self):
+    def __init__(self, max_concurrent_requests: int = 10):
         if not GROQ_API_KEY:
             print("[IAService] ERRO CRÍTICO: GROQ_API_KEY não definida!")
             raise ValueError("A variável de ambiente GROQ_API_KEY não foi definida.")
@@ -18,6 +20,21 @@ class IAService:
         )
         self.model = "llama-3.1-8b-instant"
         print(f"[IAService] Configurado para usar o modelo Groq: '{self.model}' com retentativas manuais.")
+        # Requisições de um lote seguem em paralelo, limitadas para não estourar o rate limit
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent_requests)
+
+    def submit_batch(self, prompts: List[str]) -> List[Future]:
+        # A API de chat da Groq não aceita vários prompts numa única chamada síncrona,
+        # então o lote é deduplicado: prompts idênticos compartilham uma só requisição,
+        # e os prompts únicos são enviados em paralelo. Cada future fica pronto assim que
+        # a sua resposta chega, sem esperar pelo resto do lote.
+        unique_prompts = list(dict.fromkeys(prompts))
+        print(f"[IAService] Lote com {len(prompts)} prompt(s), {len(unique_prompts)} único(s) enviados à Groq.")
+        futures = {prompt: self.executor.submit(self.ask, prompt) for prompt in unique_prompts}
+        return [futures[prompt] for prompt in prompts]
+
+    def ask_batch(self, prompts: List[str]) -> List[str]:
+        return [future.result() for future in self.submit_batch(prompts)]
 
     def ask(self, prompt: str, max_manual_retries: int = 5, initial_delay_seconds: float = 5.0) -> str:
         print(f"[IAService] Enviando para Groq (modelo: '{self.model}', prompt com {len(prompt)} chars): '{prompt[:100]}...'")
@@ -13,5 +13,31 @@ def carregar_config() -> Dict[str, Any]:
         'sdvs_from_model': [1245.97, 613.95],
         'arrival_delay': 15000,
         'qtd_services': [1, 2],
-        'loadbalancer_addresses': 'loadbalancer1:2000,loadbalancer2:3000'
+        'loadbalancer_addresses': 'loadbalancer1:2000,loadbalancer2:3000',
+        # Serviços de cada LB (como no docker-compose); a cada ciclo o Source envia um "config;"
+        # para que cada LB use os `qtd_services` primeiros da sua lista
+        'lb_service_addresses': {
+            'loadbalancer1:2000': 'service1:4001,service2:4002',
+            'loadbalancer2:3000': 'service3:4100,service4:4101'
+        },
+        # Source distribuído: com source_workers > 1 (ou endereços de workers remotos),
+        # um SourceCoordinator divide as mensagens de cada ciclo entre os workers
+        'source_workers': 1,
+        'source_worker_base_port': 5000,
+        'source_worker_addresses': '',
+        'source_cycle_start_margin': 1.0,
+        # Trace de carga: 'trace_output' grava cada requisição (JSON Lines) durante a validação;
+        # 'trace_replay' reproduz um trace gravado (ou vários, separados por vírgula, como os
+        # '<trace_output>.workerK' de uma execução distribuída), acelerado por 'trace_speedup'
+        'trace_output': '',
+        'trace_replay': '',
+        'trace_speedup': 1.0,
+        # Simulação de eventos discretos da topologia ('python main.py simulate')
+        'simulation_samples_file': 'log.txt',
+        'simulation_log_file': 'simulation_log.txt',
+        'simulation_replications': 1000,
+        'simulation_queue_size': 10,
+        'simulation_service_concurrency': 10,
+        'simulation_arrival_process': 'deterministic',
+        'simulation_seed': None
     }
@@ -1,68 +1,260 @@
+import os
 import socket
 import threading
-from typing import List
+from queue import Queue, Empty, Full
+from typing import List, Optional, Tuple
 
 from src.abstract_proxy import AbstractProxy
-from src.utils import add_timestamp_to_message
+from src.utils import add_timestamp_to_message, get_current_timestamp
+
+RELAY_BUFFER_SIZE = 64 * 1024
+RELAY_POOL_SIZE = 32
+CONFIG_PREFIX = "config;"
+
+
+class RelayResources:
+    # Buffers e pipe usados por uma conexão em passthrough; ficam num pool compartilhado do LB
+    def __init__(self):
+        self.request = bytearray(RELAY_BUFFER_SIZE)
+        self.relay = bytearray(RELAY_BUFFER_SIZE)
+        # Linux: pipe intermediário para o os.splice de socket para socket
+        self.pipe = os.pipe() if hasattr(os, "splice") else None
+
+    def close(self):
+        if self.pipe is not None:
+            os.close(self.pipe[0])
+            os.close(self.pipe[1])
+            self.pipe = None
 
 
 class LoadBalancer(AbstractProxy):
-    def __init__(self, listen_port: int, service_addresses: List[tuple]):
+    def __init__(self, listen_port: int, service_addresses: List[tuple],
+                 passthrough: bool = False, passthrough_timestamps: bool = False):
         self.listen_port = listen_port
         self.service_addresses = service_addresses
         self.current = 0
+        # Protege a troca do conjunto de serviços (mensagens "config;") e o ponteiro do round-robin
+        self.config_lock = threading.Lock()
+        # Modo passthrough (L4): apenas roteia e repassa bytes, sem decode/encode nem prints
+        self.passthrough = passthrough
+        self.passthrough_timestamps = passthrough_timestamps
+        # Buffers e pipes preallocados, compartilhados entre as threads de conexão: cada conexão
+        # pega um conjunto do pool e o devolve ao terminar, sem alocar nada no caminho da requisição
+        self.relay_pool: Queue = Queue(maxsize=RELAY_POOL_SIZE)
+        if passthrough:
+            for _ in range(RELAY_POOL_SIZE):
+                self.relay_pool.put(RelayResources())
 
     def start(self):
         server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server.bind(('0.0.0.0', self.listen_port))
         server.listen()
-        print(f"LoadBalancer listening on port {self.listen_port}")
+        print(f"LoadBalancer listening on port {self.listen_port} (passthrough={self.passthrough})")
+        handler = self.handle_client_passthrough if self.passthrough else self.handle_client
         while True:
             client_sock, _ = server.accept()
-            threading.Thread(target=self.handle_client, args=(client_sock,)).start()
+            threading.Thread(target=handler, args=(client_sock,)).start()
 
     def handle_client(self, client_sock: socket.socket):
+        # Conexões são persistentes: o cliente pode enviar várias mensagens terminadas em '\n',
+        # uma por vez, e cada resposta volta terminada em '\n'
         try:
-            data = client_sock.recv(1024).decode()
-            print(f"[LB] Mensagem recebida do cliente: {data}")
-
-            data = add_timestamp_to_message(data)
-
-            # Tenta encontrar um service livre (round-robin)
-            for _ in range(len(self.service_addresses)):
-                ip, port = self.service_addresses[self.current]
-                self.current = (self.current + 1) % len(self.service_addresses)
-                # Verifica se o service está livre
-                if self.is_service_free(ip, port):
-                    print(f"[LB] Redirecionando para serviço: {ip}:{port}")
-                    # Envia a mensagem para o service
-                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                        s.connect((ip, port))
-                        s.sendall(data.encode())
-                        response = s.recv(1024)
-                    # Adiciona o timestamp de envio à mensagem
-                    data = add_timestamp_to_message(data)
-                    client_sock.sendall(response)
-                    print(f"[LB] Resposta enviada ao cliente: {response.decode()}")
+            pending = b''
+            while True:
+                chunk = client_sock.recv(1024)
+                if not chunk:
+                    # Mensagem sem '\n' seguida de fechamento (envio único)
+                    if pending.strip():
+                        self.handle_message(client_sock, pending.decode())
                     break
-                else:
-                    print(f"[LB] Serviço ocupado: {ip}:{port}")
-            else:
-                # Nenhum service está livre
-                print("[LB] Todos os serviços estão ocupados.")
-                client_sock.sendall("busy".encode())
+                pending += chunk
+                while b'\n' in pending:
+                    line, pending = pending.split(b'\n', 1)
+                    if line.strip():
+                        self.handle_message(client_sock, line.decode())
         except Exception as e:
             print(f"Erro no LoadBalancer: {e}")
         finally:
             client_sock.close()
 
+    def handle_message(self, client_sock: socket.socket, data: str):
+        data = data.strip()
+        print(f"[LB] Mensagem recebida do cliente: {data}")
+
+        if data.startswith(CONFIG_PREFIX):
+            client_sock.sendall((self.apply_config(data) + "\n").encode())
+            return
+
+        data = add_timestamp_to_message(data)
+
+        # Tenta encontrar um service livre (round-robin)
+        target = self.choose_service()
+        if target is None:
+            # Nenhum service está livre
+            print("[LB] Todos os serviços estão ocupados.")
+            client_sock.sendall(b"busy\n")
+            return
+
+        ip, port = target
+        print(f"[LB] Redirecionando para serviço: {ip}:{port}")
+        # Envia a mensagem para o service, que responde e fecha a conexão
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.connect((ip, port))
+            s.sendall(data.encode())
+            response = b''
+            while True:
+                chunk = s.recv(1024)
+                if not chunk:
+                    break
+                response += chunk
+        client_sock.sendall(response + b"\n")
+        print(f"[LB] Resposta enviada ao cliente: {response.decode()}")
+
+    def handle_client_passthrough(self, client_sock: socket.socket):
+        resources = self.acquire_relay_resources()
+        reusable = False
+        try:
+            buf = resources.request
+            view = memoryview(buf)
+            # Reserva espaço no fim do buffer para um eventual timestamp
+            limit = RELAY_BUFFER_SIZE - 64
+            filled = 0
+            while True:
+                end = buf.find(b"\n", 0, filled)
+                if end < 0:
+                    if filled >= limit:
+                        print("Erro no LoadBalancer (passthrough): mensagem maior que o buffer.")
+                        reusable = True
+                        return
+                    size = client_sock.recv_into(view[filled:limit])
+                    if not size:
+                        # Mensagem sem '\n' seguida de fechamento (envio único)
+                        if filled:
+                            self.forward_passthrough(client_sock, view[:filled], resources)
+                        reusable = True
+                        return
+                    filled += size
+                    continue
+
+                if end:
+                    self.forward_passthrough(client_sock, view[:end], resources)
+                # Move o restante (início da próxima mensagem, se houver) para o começo do buffer
+                rest = filled - end - 1
+                if rest:
+                    buf[:rest] = bytes(view[end + 1:filled])
+                filled = rest
+        except Exception as e:
+            print(f"Erro no LoadBalancer (passthrough): {e}")
+        finally:
+            # Após um erro o pipe pode ter ficado com bytes pela metade; esse conjunto é descartado
+            self.release_relay_resources(resources, reusable)
+            client_sock.close()
+
+    def acquire_relay_resources(self) -> RelayResources:
+        try:
+            return self.relay_pool.get_nowait()
+        except Empty:
+            # Mais conexões simultâneas que o pool: aloca um conjunto extra
+            return RelayResources()
+
+    def release_relay_resources(self, resources: RelayResources, reusable: bool):
+        if reusable:
+            try:
+                self.relay_pool.put_nowait(resources)
+                return
+            except Full:
+                pass
+        resources.close()
+
+    def forward_passthrough(self, client_sock: socket.socket, message: memoryview, resources: RelayResources):
+        # Toda resposta termina em '\n', inclusive no envio único, como no modo padrão
+        if message[:len(CONFIG_PREFIX)] == CONFIG_PREFIX.encode():
+            # Mensagens de controle são raras; só elas são decodificadas
+            client_sock.sendall((self.apply_config(bytes(message).decode().strip()) + "\n").encode())
+            return
+
+        # O timestamp de chegada é tomado antes das sondagens e da conexão com o serviço,
+        # como em handle_message, para que esse tempo conte no salto LB -> serviço
+        stamp = b";" + get_current_timestamp().encode() if self.passthrough_timestamps else b""
+
+        target = self.choose_service()
+        if target is None:
+            client_sock.sendall(b"busy\n")
+            return
+
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.connect(target)
+            # Só acrescenta o timestamp de chegada se o formato da mensagem o exigir;
+            # sendmsg envia mensagem e timestamp juntos, sem concatená-los num novo buffer
+            if stamp:
+                sent = s.sendmsg([message, stamp])
+                if sent < len(message) + len(stamp):
+                    s.sendall((bytes(message) + stamp)[sent:])
+            else:
+                s.sendall(message)
+            self.relay(s, client_sock, resources)
+        client_sock.sendall(b"\n")
+
+    def choose_service(self) -> Optional[Tuple[str, int]]:
+        # Usa o conjunto de serviços vigente no início da requisição; um "config;" concorrente
+        # troca a lista inteira sem afetar as requisições que já estão em andamento
+        addresses = self.service_addresses
+        for _ in range(len(addresses)):
+            with self.config_lock:
+                ip, port = addresses[self.current % len(addresses)]
+                self.current = (self.current + 1) % len(addresses)
+            # Verifica se o service está livre
+            if self.is_service_free(ip, port):
+                return ip, port
+            if not self.passthrough:
+                print(f"[LB] Serviço ocupado: {ip}:{port}")
+        return None
+
+    def apply_config(self, config_message: str) -> str:
+        # Formato: "config;<ip1>:<port1>,<ip2>:<port2>,..."
+        try:
+            addresses = []
+            for pair_str in config_message[len(CONFIG_PREFIX):].split(","):
+                ip, port_str = pair_str.strip().rsplit(":", 1)
+                addresses.append((ip, int(port_str)))
+        except ValueError:
+            print(f"[LB] Configuração inválida ignorada: {config_message}")
+            return "config;error"
+
+        with self.config_lock:
+            self.service_addresses = addresses
+            self.current = 0
+        print(f"[LB] Serviços configurados: {addresses}")
+        return "config;ok"
+
+    @staticmethod
+    def relay(src: socket.socket, dst: socket.socket, resources: RelayResources):
+        # Repassa bytes de src para dst até src fechar a conexão
+        if resources.pipe is not None:
+            # Linux: os bytes vão de socket para socket via o pipe do pool,
+            # sem passar pelo espaço do usuário
+            read_fd, write_fd = resources.pipe
+            while True:
+                size = os.splice(src.fileno(), write_fd, RELAY_BUFFER_SIZE)
+                if not size:
+                    return
+                while size:
+                    size -= os.splice(read_fd, dst.fileno(), size)
+
+        buf = resources.relay
+        view = memoryview(buf)
+        while True:
+            size = src.recv_into(buf)
+            if not size:
+                return
+            dst.sendall(view[:size])
+
     def is_service_free(self, ip:str, port:int) -> bool:
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                 s.connect((ip, port))
-                s.sendall("ping".encode())
-                status = s.recv(1024).decode()
-                return status == "free"
+                s.sendall(b"ping")
+                return s.recv(1024) == b"free"
         except Exception:
             return False
 
@@ -0,0 +1,112 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+from typing import List, Tuple
+
+
+# Agrupa prompts concorrentes antes de chamar o backend de LLM: uma thread despachante
+# coleta os pedidos que chegam dentro de `batch_window_ms` (ou até `max_batch_size`),
+# envia o lote numa única chamada `submit_batch` (quando o backend suporta) e devolve
+# cada resposta à thread de conexão que a aguarda assim que ela fica pronta.
+# Com a janela padrão (0 ms) cada prompt segue sozinho, sem espera extra no MRT.
+class PromptBatcher:
+    def __init__(self, ia_service, batch_window_ms: float = 0.0, max_batch_size: int = 8):
+        self.ia_service = ia_service
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max(1, max_batch_size)
+        self.pending: Queue = Queue()
+
+        # Métricas acumuladas (tamanho do lote x tempo de espera)
+        self.metrics_lock = threading.Lock()
+        self.batches_dispatched: int = 0
+        self.prompts_dispatched: int = 0
+        self.total_wait_ms: float = 0.0
+
+        threading.Thread(target=self._dispatch_loop, daemon=True).start()
+
+    def ask(self, prompt: str) -> str:
+        return self.submit(prompt).result()
+
+    def submit(self, prompt: str) -> Future:
+        future: Future = Future()
+        self.pending.put((prompt, future, time.time()))
+        return future
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.time() + self.batch_window_ms / 1000.0
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except Empty:
+                    break
+            # O lote segue em paralelo para que a próxima janela comece a ser coletada
+            threading.Thread(target=self._dispatch, args=(batch,), daemon=True).start()
+
+    def _dispatch(self, batch: List[Tuple[str, Future, float]]) -> None:
+        dispatch_time = time.time()
+        prompts = [prompt for prompt, _, _ in batch]
+        wait_times_ms = [(dispatch_time - enqueued_at) * 1000 for _, _, enqueued_at in batch]
+        self._record_metrics(len(batch), wait_times_ms)
+
+        try:
+            if hasattr(self.ia_service, "submit_batch"):
+                # Cada conexão é liberada assim que a sua própria resposta chega
+                backend_futures = self.ia_service.submit_batch(prompts)
+                self._fail_unanswered(batch, backend_futures)
+                for (_, future, _), backend_future in zip(batch, backend_futures):
+                    backend_future.add_done_callback(
+                        lambda done, future=future: self._resolve(future, done))
+                return
+
+            # Backends sem suporte a lote recebem as chamadas uma a uma
+            if hasattr(self.ia_service, "ask_batch"):
+                responses = self.ia_service.ask_batch(prompts)
+            else:
+                responses = [self.ia_service.ask(prompt) for prompt in prompts]
+            self._fail_unanswered(batch, responses)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), response in zip(batch, responses):
+            future.set_result(response)
+
+    @staticmethod
+    def _fail_unanswered(batch: List[Tuple[str, Future, float]], responses: list) -> None:
+        # Um backend que devolve menos respostas que prompts deixaria conexões esperando para sempre;
+        # os prompts sem resposta falham e os demais seguem com as suas
+        if len(responses) != len(batch):
+            error = RuntimeError(f"Backend devolveu {len(responses)} resposta(s) para {len(batch)} prompt(s).")
+            for _, future, _ in batch[len(responses):]:
+                future.set_exception(error)
+
+    @staticmethod
+    def _resolve(future: Future, backend_future: Future) -> None:
+        error = backend_future.exception()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(backend_future.result())
+
+    def _record_metrics(self, batch_size: int, wait_times_ms: List[float]) -> None:
+        with self.metrics_lock:
+            self.batches_dispatched += 1
+            self.prompts_dispatched += batch_size
+            self.total_wait_ms += sum(wait_times_ms)
+            # A mensagem é montada sob o lock para que os totais correspondam entre si
+            report = (
+                f"[PromptBatcher] Lote com {batch_size} prompt(s) | espera máx {max(wait_times_ms):.2f} ms | "
+                f"tamanho médio {self.prompts_dispatched / self.batches_dispatched:.2f} | "
+                f"espera média {self.total_wait_ms / self.prompts_dispatched:.2f} ms "
+                f"({self.batches_dispatched} lotes, {self.prompts_dispatched} prompts)"
+            )
+
+        print(report)
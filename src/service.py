@@ -2,14 +2,20 @@ from queue import Queue
 import socket
 import threading
 from src.IA_service import IAService
+from src.prompt_batcher import PromptBatcher
 from src.abstract_proxy import AbstractProxy
 from src.utils import add_timestamp_to_message
 
 class Service(AbstractProxy):
-    def __init__(self, listen_port: int, service_time_ms: float, max_queue_size: int = 10):
+    def __init__(self, listen_port: int, service_time_ms: float, max_queue_size: int = 10,
+                 batch_window_ms: float = 0.0, max_batch_size: int = 8):
         self.listen_port = listen_port
         self.queue = Queue(maxsize=max_queue_size)
         self.ia_service = IAService()
+        # Prompts que chegam dentro da janela são enviados juntos ao backend de LLM
+        # (desligado por padrão: com janela 0 cada prompt segue sozinho)
+        self.batcher = PromptBatcher(self.ia_service, batch_window_ms=batch_window_ms,
+                                     max_batch_size=max_batch_size)
 
     def start(self):
         server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -47,7 +53,7 @@ class Service(AbstractProxy):
             print(f"Processing message: {data}")
 
             print(
-                self.ia_service.ask("Como a IA tem revolucionado o século 21?")
+                self.batcher.ask("Como a IA tem revolucionado o século 21?")
             )
 
             # Adiciona timestamp de envio à mensagem
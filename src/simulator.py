@@ -0,0 +1,154 @@
+import os
+import re
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.abstract_proxy import AbstractProxy
+from src.workload_trace import hop_latencies_ms, read_trace, response_timestamps
+
+MESSAGE_PATTERN = re.compile(r"Mensagem considerada: '([^']*)' \| Tempo de resposta \(MRT\): ([\d.]+) ms")
+
+
+def load_latency_samples(path: str) -> np.ndarray:
+    # Extrai amostras medidas (pré-serviço, serviço, pós-serviço), em ms, de um log do Source
+    # (log.txt) ou de um trace JSON Lines. Os saltos da resposta terminam sempre em
+    # "... -> chegada no serviço -> saída do serviço -> source".
+    hops_per_message: List[List[float]] = []
+    if path.endswith(".jsonl"):
+        for record in read_trace(path):
+            hops_per_message.append(record.get("hops_ms") or [])
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                match = MESSAGE_PATTERN.search(line)
+                if not match:
+                    continue
+                response, mrt = match.group(1), float(match.group(2))
+                # O primeiro timestamp é o do Source, mesmo em mensagens de replay com padding
+                timestamps = response_timestamps(response)
+                if not timestamps:
+                    continue # Ex.: respostas "busy"
+                hops_per_message.append(hop_latencies_ms(response, timestamps[0] + mrt / 1000.0))
+
+    samples = [
+        (sum(hops[:-2]), hops[-2], hops[-1])
+        for hops in hops_per_message if len(hops) >= 2
+    ]
+    return np.array(samples, dtype=float).reshape(-1, 3)
+
+
+class TopologySimulator(AbstractProxy):
+    # Simulação de eventos discretos de Source -> LoadBalancer -> Service. Cada ciclo é simulado
+    # para todas as replicações de uma vez, com arrays NumPy indexados por replicação:
+    #   - chegadas determinísticas (arrival_delay) ou de Poisson, alternando entre os LBs como o Source;
+    #   - cada LB faz round-robin entre seus `qts` serviços, sondando o próximo quando um está "busy",
+    #     e rejeita a mensagem quando todos estão cheios;
+    #   - cada serviço aceita até `queue_size` requisições no sistema e atende `concurrency` por vez
+    #     (o Service atual processa em paralelo todas as que aceitou);
+    #   - latências de rede e tempos de serviço são reamostrados de medições reais.
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        # O log da simulação é separado para não truncar o log medido usado como amostra
+        super().__init__(config.get("simulation_log_file", "simulation_log.txt"))
+        self.arrival_delay: float = config.get("arrival_delay", 0)
+        self.max_considered_messages_expected: int = config.get("max_considered_messages_expected", 10)
+        self.qtd_services: List[int] = config.get("qtd_services", [])
+        self.replications: int = config.get("simulation_replications", 1000)
+        self.queue_size: int = config.get("simulation_queue_size", 10)
+        self.concurrency: int = min(config.get("simulation_service_concurrency", self.queue_size), self.queue_size)
+        self.arrival_process: str = config.get("simulation_arrival_process", "deterministic")
+        self.samples_file: str = config.get("simulation_samples_file", "log.txt")
+        self.rng = np.random.default_rng(config.get("simulation_seed"))
+
+        loadbalancer_addresses = config.get("loadbalancer_addresses", "")
+        if isinstance(loadbalancer_addresses, str):
+            loadbalancer_addresses = [address for address in loadbalancer_addresses.split(",") if address]
+        self.num_balancers: int = max(1, len(loadbalancer_addresses))
+
+    def run(self) -> None:
+        self.log("Starting simulation")
+        if not os.path.exists(self.samples_file):
+            self.log(f"Erro: arquivo de amostras não encontrado em {self.samples_file}")
+            return
+        samples = load_latency_samples(self.samples_file)
+        if not len(samples):
+            self.log(f"Erro: nenhuma amostra de latência encontrada em {self.samples_file}")
+            return
+
+        self.log(f"{len(samples)} amostras de latência carregadas de {self.samples_file}")
+        self.log(f"Replicações por ciclo: {self.replications} | chegadas: {self.arrival_process} | "
+                 f"fila: {self.queue_size} | concorrência por serviço: {self.concurrency}")
+
+        for cycle, qts in enumerate(self.qtd_services):
+            self.log(f"Iniciando Ciclo {cycle} com {qts} serviços.")
+            response_times = self.simulate_cycle(qts, samples)
+            self.log_cycle_report(cycle, response_times)
+
+    def simulate_cycle(self, qts: int, samples: np.ndarray) -> np.ndarray:
+        # Retorna os MRTs (ms) com shape (replicações, mensagens); NaN marca mensagens rejeitadas
+        replications, messages = self.replications, self.max_considered_messages_expected
+        rows = np.arange(replications)
+
+        if self.arrival_process == "poisson":
+            gaps = self.rng.exponential(self.arrival_delay, (replications, messages))
+            arrivals = np.cumsum(gaps, axis=1) - gaps[:, :1]
+        else:
+            arrivals = np.broadcast_to(np.arange(messages) * float(self.arrival_delay), (replications, messages))
+
+        drawn = samples[self.rng.integers(0, len(samples), (replications, messages))]
+        pre_service, service_time, post_service = drawn[..., 0], drawn[..., 1], drawn[..., 2]
+
+        # Estado por replicação, LB e serviço: saída das requisições no sistema e liberação dos atendentes
+        departures = np.zeros((replications, self.num_balancers, qts, self.queue_size))
+        servers_free_at = np.zeros((replications, self.num_balancers, qts, self.concurrency))
+        pointers = np.zeros((replications, self.num_balancers), dtype=int)
+        response_times = np.full((replications, messages), np.nan)
+
+        for i in range(messages):
+            lb = i % self.num_balancers
+            now = arrivals[:, i] + pre_service[:, i]
+
+            # Sondagem em round-robin a partir do ponteiro do LB
+            in_system = (departures[:, lb] > now[:, None, None]).sum(axis=2)
+            order = (pointers[:, lb, None] + np.arange(qts)) % qts
+            free_in_order = np.take_along_axis(in_system < self.queue_size, order, axis=1)
+            accepted = free_in_order.any(axis=1)
+            chosen = order[rows, free_in_order.argmax(axis=1)]
+            # Cada sondagem avança o ponteiro; se todos estão ocupados ele dá a volta completa
+            pointers[:, lb] = np.where(accepted, (chosen + 1) % qts, pointers[:, lb])
+
+            r, s = rows[accepted], chosen[accepted]
+            server = servers_free_at[r, lb, s].argmin(axis=1)
+            start = np.maximum(now[accepted], servers_free_at[r, lb, s, server])
+            finish = start + service_time[accepted, i]
+            servers_free_at[r, lb, s, server] = finish
+
+            slot = (departures[r, lb, s] <= now[accepted, None]).argmax(axis=1)
+            departures[r, lb, s, slot] = finish
+
+            response_times[accepted, i] = finish + post_service[accepted, i] - arrivals[accepted, i]
+
+        return response_times
+
+    def log_cycle_report(self, cycle: int, response_times: np.ndarray) -> None:
+        considered = response_times[~np.isnan(response_times)]
+        rejected = int(np.isnan(response_times).sum())
+
+        avg_mrt = float(considered.mean()) if considered.size else 0.0
+        sd_mrt = float(considered.std()) if considered.size else 0.0
+        # Intervalo de confiança de 95% da média do MRT entre as replicações
+        counts = (~np.isnan(response_times)).sum(axis=1)
+        replication_means = np.nansum(response_times, axis=1)[counts > 0] / counts[counts > 0]
+        ci_mrt = 0.0
+        if len(replication_means) > 1:
+            ci_mrt = float(1.96 * replication_means.std(ddof=1) / np.sqrt(len(replication_means)))
+
+        self.log(f"Ciclo {cycle} finalizado.")
+        self.log(f"Replicações simuladas: {response_times.shape[0]}")
+        self.log(f"Mensagens efetivamente consideradas (com MRT): {considered.size}")
+        self.log(f"Mensagens rejeitadas (busy): {rejected}")
+        self.log(f"MRT médio: {avg_mrt:.2f} ms")
+        self.log(f"Desvio padrão do MRT: {sd_mrt:.2f} ms")
+        self.log(f"IC 95% do MRT médio: ± {ci_mrt:.2f} ms")
+        self.log("==============================")
@@ -1,10 +1,11 @@
 import socket
 import threading
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
 from src.abstract_proxy import AbstractProxy
 from src.utils import get_current_timestamp
+from src.workload_trace import TraceWriter, read_traces, build_trace_record
 
 
 class Source(AbstractProxy):
@@ -20,8 +21,16 @@ class Source(AbstractProxy):
         self.qtd_services: List[int] = config.get("qtd_services", [])
         self.cycles_completed: List[bool] = [False] * len(self.qtd_services)
         self.dropp_count: int = 0
+        self.results_lock = threading.Lock()
         self.loadbalancer_addresses = config.get("loadbalancer_addresses", "")
 
+        # Conjunto de serviços de cada LB ("ip:porta" -> "ip1:porta1,ip2:porta2,..."), usado para
+        # configurar os `qts` serviços de cada ciclo
+        self.lb_service_addresses: Dict[str, str] = config.get("lb_service_addresses", {})
+        # Conexões persistentes com os LBs, reaproveitadas pelas mensagens de um mesmo ciclo
+        self.connection_pool: Dict[Tuple[str, int], List[socket.socket]] = {}
+        self.pool_lock = threading.Lock()
+
         self.target_ip: str = config.get("target_ip", "loadbalancer1")
         self.target_port: int = config.get("target_port", 2000)
 
@@ -35,13 +44,30 @@ class Source(AbstractProxy):
                 for address in self.loadbalancer_addresses.split(",")
             ]
 
+        # Trace de carga: gravado durante a validação e/ou reproduzido no lugar dela
+        self.trace_output: str = config.get("trace_output", "")
+        self.trace_replay: str = config.get("trace_replay", "")
+        self.trace_speedup: float = config.get("trace_speedup", 1.0)
+        self.trace_writer: Optional[TraceWriter] = None
+        if self.trace_output and not self.model_feeding_stage:
+            if self.trace_output in self.trace_replay.split(","):
+                # Abrir o trace para escrita o esvaziaria antes de o replay lê-lo
+                self.log(f"AVISO: trace_output ({self.trace_output}) é um dos traces reproduzidos; o trace não será gravado.")
+            else:
+                self.trace_writer = TraceWriter(self.trace_output)
+
     def run(self) -> None:
         self.log("Starting source")
         if self.model_feeding_stage:
             self.send_message_feeding_stage()
+        elif self.trace_replay:
+            self.replay_trace(self.trace_replay, self.trace_speedup)
         else:
             self.send_messages_validation_stage()
 
+        if self.trace_writer:
+            self.trace_writer.close()
+
     def send_message_feeding_stage(self) -> None:
         self.log("Model Feeding Stage Started")
         for _ in range(10): # Mantido como 10 para o estágio de alimentação
@@ -54,89 +80,190 @@ class Source(AbstractProxy):
     def send_messages_validation_stage(self) -> None:
         for cycle, qts in enumerate(self.qtd_services):
             self.log(f"Iniciando Ciclo {cycle} com {qts} serviços.")
-            self.source_current_index_message = 1 # Reinicia índice da mensagem para o ciclo
-
-            # Listas locais para os resultados deste ciclo específico
-            current_cycle_response_times: List[float] = []
-            current_cycle_considered_messages: List[str] = []
-            
-            num_balancers = len(self.loadbalancer_addresses)
-            start_time_cycle = time.time() # Tempo de início para o ciclo
-            
-            # Ajuste o timeout geral para as threads do ciclo se necessário.
-            # Se o arrival_delay é 5s e há 10 mensagens, o envio leva ~50s.
-            # Um timeout de 10s para todas as threads juntas pode ser muito curto.
-            # Considere um timeout por thread ou um timeout total maior.
-            # Ex: timeout_per_thread = 30 (segundos) ou total_timeout_for_cycle = 60 + self.max_considered_messages_expected * (self.arrival_delay/1000.0)
-            
-            # Aqui, vamos manter o timeout original para o join, mas a coleta de resultados é mais robusta.
-            # O timeout do join agora é relativo ao tempo restante no ciclo de envio.
-            # No entanto, é melhor ter um timeout por thread, que pode ser gerenciado no `send_and_receive_to_lb`
-            # ou um timeout de join mais generoso.
-            # Para este exemplo, vamos simplificar e dar um timeout maior para o join de cada thread.
-            thread_join_timeout = 30.0 # Segundos de timeout para cada thread no join
-
-            threads: list[threading.Thread] = []
-
-            for i in range(self.max_considered_messages_expected):
-                if not self.loadbalancer_addresses:
-                    self.log("Erro: Nenhum endereço de load balancer configurado.")
-                    break 
-                lb_ip, lb_port = self.loadbalancer_addresses[i % num_balancers]
-
-                # A configuração do servidor pode ser feita uma vez por ciclo por load balancer, se aplicável
-                # Para simplificar, mantemos como está, mas pode ser otimizado.
-                config_message = "config;" + ",".join([f"{lb_ip}:{4001 + j}" for j in range(qts)])
-                self.send_message_to_configure_server(config_message, lb_ip, lb_port)
-
-                msg = f"{cycle};{self.source_current_index_message};{get_current_timestamp()}"
-                
-                # Passa as listas locais para a thread
-                t = threading.Thread(target=self.send_and_receive_to_lb, 
-                                     args=(lb_ip, lb_port, msg, cycle, 
-                                           current_cycle_response_times, 
-                                           current_cycle_considered_messages))
-                t.start()
-                threads.append(t)
-                self.source_current_index_message += 1
-                if i < self.max_considered_messages_expected -1 : # Evita delay após a última mensagem
-                    time.sleep(self.arrival_delay / 1000.0)
-            
-            for i, t in enumerate(threads):
-                thread_start_time_for_join_calc = time.time() # Não usado no timeout fixo
-                # Use um timeout fixo por thread no join
-                t.join(timeout=thread_join_timeout)
-                if t.is_alive():
-                    self.log(f"AVISO: Thread {i} do ciclo {cycle} ainda ativa após timeout de {thread_join_timeout}s no join.")
-                    # Você pode decidir o que fazer aqui: tentar cancelar, ignorar, etc.
-                    # Para este exemplo, apenas logamos.
+            self.configure_load_balancers(qts)
+
+            # Um Source sozinho envia todas as mensagens do ciclo, começando agora
+            indices = list(range(1, self.max_considered_messages_expected + 1))
+            cycle_result = self.send_cycle_messages(cycle, qts, indices, time.time())
 
             self.cycles_completed[cycle] = True
+            self.log_cycle_report(cycle, cycle_result)
+
+    def send_cycle_messages(self, cycle: int, qts: int, indices: List[int], start_at: float) -> Dict[str, Any]:
+        # Envia as mensagens de `indices` (1-based) seguindo o cronograma de chegadas do ciclo:
+        # a mensagem i parte em start_at + (i - 1) * arrival_delay. Workers de um SourceCoordinator
+        # recebem subconjuntos disjuntos dos índices e o mesmo start_at.
+
+        # Listas locais para os resultados deste ciclo específico
+        current_cycle_response_times: List[float] = []
+        current_cycle_considered_messages: List[str] = []
+
+        num_balancers = len(self.loadbalancer_addresses)
+
+        threads: list[threading.Thread] = []
+
+        for index in indices:
+            if not self.loadbalancer_addresses:
+                self.log("Erro: Nenhum endereço de load balancer configurado.")
+                break
+            position = index - 1
+            lb_ip, lb_port = self.loadbalancer_addresses[position % num_balancers]
+
+            # Aguarda o instante programado para esta mensagem no cronograma do ciclo
+            delay = start_at + position * self.arrival_delay / 1000.0 - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+            self.source_current_index_message = index
+            msg = f"{cycle};{index};{get_current_timestamp()}"
+            offset_ms = (time.time() - start_at) * 1000
+            sequence = self.trace_writer.reserve() if self.trace_writer else 0
+
+            # Passa as listas locais para a thread
+            t = threading.Thread(target=self.send_and_record,
+                                 args=(lb_ip, lb_port, msg, cycle, qts, index, offset_ms, sequence,
+                                       current_cycle_response_times,
+                                       current_cycle_considered_messages))
+            t.start()
+            threads.append(t)
+
+        return self.collect_cycle_results(cycle, threads, current_cycle_response_times,
+                                          current_cycle_considered_messages)
+
+    def collect_cycle_results(self, cycle: int, threads: List[threading.Thread],
+                              response_times: List[float], considered_messages: List[str]) -> Dict[str, Any]:
+        # Timeout fixo por thread no join. Se o arrival_delay é 5s e há 10 mensagens, o envio leva ~50s,
+        # então um timeout total curto para todas as threads juntas não funcionaria.
+        thread_join_timeout = 30.0 # Segundos de timeout para cada thread no join
+
+        for i, t in enumerate(threads):
+            t.join(timeout=thread_join_timeout)
+            if t.is_alive():
+                self.log(f"AVISO: Thread {i} do ciclo {cycle} ainda ativa após timeout de {thread_join_timeout}s no join.")
+        self.close_connections()
+
+        dropped = len(threads) - len(response_times)
+        self.dropp_count += dropped
+
+        return {
+            "cycle": cycle,
+            "sent": len(threads),
+            "dropped": dropped,
+            "response_times": response_times,
+            "considered_messages": considered_messages,
+        }
+
+    def replay_trace(self, trace_path: str, speedup: float = 1.0) -> None:
+        # Reproduz um trace gravado contra a topologia atual, respeitando os instantes de chegada
+        # divididos por `speedup`. O trace é lido em streaming: o TraceWriter grava os registros na
+        # ordem de envio, então os instantes de chegada são sempre crescentes dentro de um ciclo.
+        # `trace_path` aceita vários arquivos separados por vírgula (ex.: os traces dos workers de
+        # uma execução distribuída), que são intercalados por instante de chegada.
+        trace_paths = [path for path in trace_path.split(",") if path]
+        self.log(f"Replay do trace {', '.join(trace_paths)} com aceleração de {speedup}x")
+
+        cycle_state: Optional[Dict[str, Any]] = None
+        for record in read_traces(trace_paths):
+            cycle = record["cycle"]
+            if cycle_state is None or cycle_state["cycle"] != cycle:
+                if cycle_state is not None:
+                    self.finish_replay_cycle(cycle_state)
+                qts = record.get("qts", 0)
+                self.log(f"Iniciando Ciclo {cycle} com {qts} serviços.")
+                self.configure_load_balancers(qts)
+                cycle_state = {"cycle": cycle, "qts": qts, "start_at": time.time(), "threads": [],
+                               "response_times": [], "considered_messages": []}
+
+            lb_ip, lb_port = self.replay_target(record)
+
+            delay = cycle_state["start_at"] + record["offset_ms"] / 1000.0 / speedup - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+            index = record["index"]
+            self.source_current_index_message = index
+            msg = self.build_replay_message(cycle, index, record.get("payload_bytes", 0))
+            offset_ms = (time.time() - cycle_state["start_at"]) * 1000
+            sequence = self.trace_writer.reserve() if self.trace_writer else 0
 
-            # Agora as estatísticas são baseadas nas listas locais do ciclo
-            total_msgs = len(current_cycle_response_times) # Ou len(current_cycle_considered_messages)
-            
-            # Garante que as duas listas tenham o mesmo tamanho se for usar response_times para avg/std
-            # Isso pode não ser necessário se send_and_receive_to_lb sempre adicionar a ambas ou a nenhuma.
-            # Se current_cycle_response_times pode ser menor, use len(current_cycle_response_times)
-            # e apenas os tempos dessa lista.
+            t = threading.Thread(target=self.send_and_record,
+                                 args=(lb_ip, lb_port, msg, cycle, cycle_state["qts"], index, offset_ms, sequence,
+                                       cycle_state["response_times"],
+                                       cycle_state["considered_messages"]))
+            t.start()
+            cycle_state["threads"].append(t)
 
-            avg_mrt = self.calculate_average(current_cycle_response_times)
-            sd_mrt = self.calculate_standard_deviation(current_cycle_response_times)
+        if cycle_state is not None:
+            self.finish_replay_cycle(cycle_state)
 
-            self.log(f"Ciclo {cycle} finalizado.")
-            self.log(f"Mensagens efetivamente consideradas (com MRT): {total_msgs}")
-            self.log(f"Lista de mensagens consideradas (respostas): {len(current_cycle_considered_messages)}")
-            self.log(f"MRT médio: {avg_mrt:.2f} ms")
-            self.log(f"Desvio padrão do MRT: {sd_mrt:.2f} ms")
-            self.log("==============================")
+    def finish_replay_cycle(self, cycle_state: Dict[str, Any]) -> None:
+        cycle = cycle_state["cycle"]
+        cycle_result = self.collect_cycle_results(cycle, cycle_state["threads"],
+                                                  cycle_state["response_times"],
+                                                  cycle_state["considered_messages"])
+        self.log_cycle_report(cycle, cycle_result)
+
+    def replay_target(self, record: Dict[str, Any]) -> Tuple[str, int]:
+        # Mantém o LB gravado se ele existe na topologia atual; senão distribui pelo índice
+        ip, _, port = record.get("lb", "").rpartition(":")
+        if ip and port.isdigit() and (ip, int(port)) in self.loadbalancer_addresses:
+            return ip, int(port)
+        return self.loadbalancer_addresses[(record["index"] - 1) % len(self.loadbalancer_addresses)]
+
+    @staticmethod
+    def build_replay_message(cycle: int, index: int, payload_bytes: int) -> str:
+        msg = f"{cycle};{index};{get_current_timestamp()}"
+        # Completa a mensagem até o tamanho gravado com um campo de padding antes do timestamp
+        padding = payload_bytes - len(msg.encode()) - 1
+        if padding > 0:
+            msg = f"{cycle};{index};{'x' * padding};{get_current_timestamp()}"
+        return msg
+
+    def configure_load_balancers(self, qts: int) -> None:
+        # Uma vez por ciclo, antes das mensagens: cada LB passa a usar os `qts` primeiros serviços
+        # do seu conjunto, fora do período medido
+        for lb_ip, lb_port in self.loadbalancer_addresses:
+            services = self.lb_service_addresses.get(f"{lb_ip}:{lb_port}", "")
+            addresses = [address.strip() for address in services.split(",") if address.strip()]
+            if not addresses:
+                self.log(f"Sem serviços configurados para {lb_ip}:{lb_port} em lb_service_addresses; o LB mantém seus serviços atuais.")
+                continue
+            if len(addresses) < qts:
+                self.log(f"AVISO: {lb_ip}:{lb_port} tem apenas {len(addresses)} serviços conhecidos para o ciclo com {qts}.")
+            config_message = "config;" + ",".join(addresses[:qts])
+            self.send_message_to_configure_server(config_message, lb_ip, lb_port)
+
+    def send_and_record(self, ip: str, port: int, msg: str, cycle: int, qts: int, index: int, offset_ms: float,
+                        sequence: int, cycle_response_times: List[float], cycle_considered_messages: List[str]) -> None:
+        outcome = self.send_and_receive_to_lb(ip, port, msg, cycle, cycle_response_times, cycle_considered_messages)
+        if self.trace_writer:
+            response, mrt = outcome if outcome else (None, None)
+            self.trace_writer.write(sequence, build_trace_record(cycle, index, qts, offset_ms, ip, port, msg, response, mrt))
+
+    def log_cycle_report(self, cycle: int, cycle_result: Dict[str, Any]) -> None:
+        response_times = cycle_result["response_times"]
+
+        avg_mrt = self.calculate_average(response_times)
+        sd_mrt = self.calculate_standard_deviation(response_times)
+
+        self.log(f"Ciclo {cycle} finalizado.")
+        self.log(f"Mensagens efetivamente consideradas (com MRT): {len(response_times)}")
+        self.log(f"Lista de mensagens consideradas (respostas): {len(cycle_result['considered_messages'])}")
+        self.log(f"Mensagens enviadas: {cycle_result['sent']} | descartadas (sem resposta): {cycle_result['dropped']}")
+        self.log(f"MRT médio: {avg_mrt:.2f} ms")
+        self.log(f"Desvio padrão do MRT: {sd_mrt:.2f} ms")
+        self.log("==============================")
 
     def send_message_to_configure_server(self, config_message: str, ip: str, port: int) -> None:
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                 s.settimeout(15.0) # Adiciona um timeout para conexão e envio
                 s.connect((ip, port))
-                s.sendall(config_message.encode())
+                s.sendall((config_message + "\n").encode())
+                # Aguarda a confirmação para que o ciclo só comece com a configuração aplicada
+                reply = self.receive_line(s).decode('utf-8', errors='replace').strip()
+                if reply != "config;ok":
+                    self.log(f"LB {ip}:{port} não aplicou a configuração '{config_message}': {reply or 'sem resposta'}")
         except socket.timeout:
             self.log(f"Timeout ao enviar mensagem de configuração para {ip}:{port}")
         except Exception as e:
@@ -147,7 +274,7 @@ class Source(AbstractProxy):
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                 s.settimeout(5.0) # Adiciona um timeout
                 s.connect((self.target_ip, self.target_port))
-                s.sendall(msg.encode())
+                s.sendall((msg + "\n").encode())
         except socket.timeout:
             self.log(f"Timeout ao enviar mensagem (feeding stage) para {self.target_ip}:{self.target_port}")
         except Exception as e:
@@ -156,56 +283,100 @@ class Source(AbstractProxy):
     def send_and_receive_to_lb(self, ip: str, port: int, msg: str, cycle: int, 
                                  # Parâmetros adicionados para as listas locais do ciclo:
                                  cycle_response_times: List[float], 
-                                 cycle_considered_messages: List[str]) -> None:
+                                 cycle_considered_messages: List[str]) -> Optional[Tuple[str, float]]:
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(20.0) # Define um timeout para operações de socket (connect, send, recv)
-                                   # Ajuste este valor conforme necessário. Deve ser menor que o thread_join_timeout.
-                s.connect((ip, port))
+            sent_timestamp = float(msg.split(";")[-1])
+            response_bytes = self.exchange(ip, port, msg)
+
+            response = response_bytes.decode('utf-8', errors='replace').strip()
+            if not response:
+                self.log(f"[Ciclo {cycle}] Resposta vazia de {ip}:{port} para msg: {msg}")
+                return None # Não adiciona se a resposta for vazia
 
-                sent_timestamp = float(msg.split(";")[-1])
-                s.sendall(msg.encode())
-                
-                response_bytes = b''
-                try:
-                    # Loop para garantir que todos os dados sejam recebidos se forem fragmentados
-                    # Isso é uma simplificação; um recv mais robusto lidaria com tamanho exato ou delimitador
-                    while True:
-                        chunk = s.recv(1024)
-                        if not chunk:
-                            break # Conexão fechada pelo servidor
-                        response_bytes += chunk
-                        if len(response_bytes) >= 1024 or b'\n' in response_bytes: # Exemplo de condição de parada
-                             # Se você espera uma resposta delimitada por \n, pode verificar aqui.
-                             # Ou se você sabe o tamanho da resposta, pode verificar.
-                             # Se a resposta pode ser menor que 1024 e não tem delimitador claro,
-                             # o recv pode bloquear até o timeout se o servidor não fechar a conexão.
-                             # Para este caso, vamos assumir que 1024 é suficiente ou o servidor fecha.
-                            break
-                except socket.timeout:
-                    self.log(f"[Ciclo {cycle}] Timeout ao receber resposta de {ip}:{port} para msg: {msg}")
-                    return # Não adiciona às listas se houver timeout no recv
-
-                response = response_bytes.decode('utf-8', errors='replace').strip()
-                if not response:
-                    self.log(f"[Ciclo {cycle}] Resposta vazia de {ip}:{port} para msg: {msg}")
-                    return # Não adiciona se a resposta for vazia
-
-                receive_time = time.time()
-                mrt = (receive_time - sent_timestamp) * 1000  # tempo em ms
-
-                # Adiciona aos resultados do ciclo atual
+            receive_time = time.time()
+            mrt = (receive_time - sent_timestamp) * 1000  # tempo em ms
+
+            # Adiciona aos resultados do ciclo atual; o lock mantém as duas listas alinhadas
+            # (a posição k de uma corresponde à posição k da outra)
+            with self.results_lock:
                 cycle_response_times.append(mrt)
                 cycle_considered_messages.append(response)
 
-                self.log(f"[Ciclo {cycle}] Mensagem considerada: '{response}' | Tempo de resposta (MRT): {mrt:.2f} ms")
+            self.log(f"[Ciclo {cycle}] Mensagem considerada: '{response}' | Tempo de resposta (MRT): {mrt:.2f} ms")
+            return response, mrt
 
         except socket.timeout:
-            self.log(f"[Ciclo {cycle}] Timeout na operação de socket para {ip}:{port} (ex: connect, send). Msg: {msg}")
+            self.log(f"[Ciclo {cycle}] Timeout na operação de socket para {ip}:{port} (connect, send ou recv). Msg: {msg}")
         except ConnectionRefusedError:
             self.log(f"[Ciclo {cycle}] Conexão recusada por {ip}:{port}. Msg: {msg}")
         except Exception as e:
             self.log(f"[Ciclo {cycle}] Erro em send_and_receive_to_lb para {ip}:{port}: {e}. Msg: {msg}")
+        return None
+
+    def exchange(self, ip: str, port: int, msg: str) -> bytes:
+        # Envia a mensagem (terminada em '\n') por uma conexão persistente e lê a resposta.
+        # Uma conexão reaproveitada pode ter sido fechada pelo LB enquanto estava ociosa;
+        # nesse caso a mensagem é reenviada uma vez numa conexão nova.
+        for attempt in range(2):
+            s, reused = self.acquire_connection(ip, port)
+            try:
+                s.sendall((msg + "\n").encode())
+                response_bytes = self.receive_line(s)
+            except (ConnectionResetError, BrokenPipeError):
+                s.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except BaseException:
+                s.close()
+                raise
+
+            if response_bytes.endswith(b"\n"):
+                self.release_connection(ip, port, s)
+                return response_bytes
+            # Sem '\n' o LB fechou a conexão, que não pode voltar ao pool
+            s.close()
+            if response_bytes or not reused:
+                return response_bytes
+        return b''
+
+    def acquire_connection(self, ip: str, port: int) -> Tuple[socket.socket, bool]:
+        with self.pool_lock:
+            idle = self.connection_pool.get((ip, port))
+            if idle:
+                return idle.pop(), True
+
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.settimeout(20.0) # Define um timeout para operações de socket (connect, send, recv)
+                           # Ajuste este valor conforme necessário. Deve ser menor que o thread_join_timeout.
+        try:
+            s.connect((ip, port))
+        except BaseException:
+            s.close()
+            raise
+        return s, False
+
+    def release_connection(self, ip: str, port: int, s: socket.socket) -> None:
+        with self.pool_lock:
+            self.connection_pool.setdefault((ip, port), []).append(s)
+
+    def close_connections(self) -> None:
+        with self.pool_lock:
+            pool, self.connection_pool = self.connection_pool, {}
+        for connections in pool.values():
+            for s in connections:
+                s.close()
+
+    @staticmethod
+    def receive_line(s: socket.socket) -> bytes:
+        # Lê até o '\n' que termina a resposta ou até o outro lado fechar a conexão
+        response_bytes = b''
+        while b'\n' not in response_bytes:
+            chunk = s.recv(1024)
+            if not chunk:
+                break # Conexão fechada pelo servidor
+            response_bytes += chunk
+        return response_bytes
 
     @staticmethod
     def calculate_average(lst: List[float]) -> float:
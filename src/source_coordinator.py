@@ -0,0 +1,192 @@
+import json
+import multiprocessing
+import socket
+import time
+from typing import List, Dict, Any
+
+from src.source import Source
+
+
+def send_command(stream, command: Dict[str, Any]) -> None:
+    # Canal de controle: uma mensagem JSON por linha
+    stream.write((json.dumps(command) + "\n").encode())
+    stream.flush()
+
+
+def receive_command(stream) -> Dict[str, Any]:
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Canal de controle fechado pelo outro lado.")
+    return json.loads(line)
+
+
+def message_index(response: str) -> int:
+    # Respostas têm o formato "<ciclo>;<índice>;<timestamps...>"
+    try:
+        return int(response.split(";")[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+class SourceWorker:
+    def __init__(self, listen_port: int):
+        self.listen_port = listen_port
+
+    def start(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(('0.0.0.0', self.listen_port))
+        server.listen()
+        print(f"SourceWorker listening on port {self.listen_port}")
+        while True:
+            # Atende um coordenador por vez
+            coordinator_sock, _ = server.accept()
+            self.handle_coordinator(coordinator_sock)
+
+    def handle_coordinator(self, coordinator_sock: socket.socket):
+        source = None
+        worker_index, num_workers = 0, 1
+        try:
+            with coordinator_sock, coordinator_sock.makefile('rwb') as stream:
+                while True:
+                    command = receive_command(stream)
+                    cmd = command.get("cmd")
+
+                    if cmd == "setup":
+                        worker_index = command["worker_index"]
+                        num_workers = command["num_workers"]
+                        self.close_trace(source)
+                        source = Source(command["config"])
+                        print(f"[SourceWorker] Worker {worker_index + 1}/{num_workers} configurado.")
+
+                    elif cmd == "cycle":
+                        # Cada worker fica com os índices i em que (i - 1) % num_workers == worker_index
+                        indices = list(range(worker_index + 1, source.max_considered_messages_expected + 1, num_workers))
+                        cycle_result = source.send_cycle_messages(command["cycle"], command["qts"], indices, command["start_at"])
+                        send_command(stream, cycle_result)
+
+                    elif cmd == "shutdown":
+                        return
+        except Exception as e:
+            print(f"[SourceWorker] Erro no canal de controle: {e}")
+        finally:
+            # Grava os registros pendentes e libera o arquivo antes de atender o próximo coordenador
+            self.close_trace(source)
+
+    @staticmethod
+    def close_trace(source) -> None:
+        if source is not None and source.trace_writer:
+            source.trace_writer.close()
+
+
+def run_source_worker(listen_port: int) -> None:
+    SourceWorker(listen_port).start()
+
+
+class SourceCoordinator(Source):
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        # O coordenador não envia mensagens de validação; o trace é gravado pelos workers
+        super().__init__(dict(config, trace_output=""))
+        self.config = config
+        self.num_workers: int = config.get("source_workers", 1)
+        self.worker_base_port: int = config.get("source_worker_base_port", 5000)
+        # Tempo entre o envio do comando de ciclo e o início sincronizado dos workers
+        self.cycle_start_margin: float = config.get("source_cycle_start_margin", 1.0)
+        self.worker_processes: List[multiprocessing.Process] = []
+
+        # Workers remotos ("host:porta,..."), iniciados com `python main.py source_worker <porta>`.
+        # Sem endereços, o coordenador sobe `source_workers` processos locais.
+        self.worker_addresses = config.get("source_worker_addresses", "")
+        if isinstance(self.worker_addresses, str):
+            self.worker_addresses = [
+                (address.split(":")[0], int(address.split(":")[1]))
+                for address in self.worker_addresses.split(",") if address
+            ]
+
+    def send_messages_validation_stage(self) -> None:
+        streams = self.connect_workers()
+        try:
+            for cycle, qts in enumerate(self.qtd_services):
+                self.log(f"Iniciando Ciclo {cycle} com {qts} serviços.")
+                # O coordenador configura os LBs uma única vez; os workers só enviam mensagens
+                self.configure_load_balancers(qts)
+
+                # Todos os workers começam o ciclo no mesmo instante (relógios sincronizados, ex.: NTP)
+                start_at = time.time() + self.cycle_start_margin
+                for stream in streams:
+                    send_command(stream, {"cmd": "cycle", "cycle": cycle, "qts": qts, "start_at": start_at})
+                worker_results = [receive_command(stream) for stream in streams]
+
+                cycle_result = self.merge_cycle_results(cycle, worker_results)
+                self.cycles_completed[cycle] = True
+                self.log_cycle_report(cycle, cycle_result)
+        finally:
+            self.stop_workers(streams)
+
+    def merge_cycle_results(self, cycle: int, worker_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        considered = []
+        for result in worker_results:
+            considered.extend(zip(result["considered_messages"], result["response_times"]))
+        considered.sort(key=lambda item: message_index(item[0]))
+
+        for response, mrt in considered:
+            self.log(f"[Ciclo {cycle}] Mensagem considerada: '{response}' | Tempo de resposta (MRT): {mrt:.2f} ms")
+
+        dropped = sum(result["dropped"] for result in worker_results)
+        self.dropp_count += dropped
+
+        return {
+            "cycle": cycle,
+            "sent": sum(result["sent"] for result in worker_results),
+            "dropped": dropped,
+            "response_times": [mrt for _, mrt in considered],
+            "considered_messages": [response for response, _ in considered],
+        }
+
+    def connect_workers(self) -> list:
+        addresses = self.worker_addresses
+        if not addresses:
+            addresses = [("127.0.0.1", self.worker_base_port + k) for k in range(self.num_workers)]
+            for _, port in addresses:
+                process = multiprocessing.Process(target=run_source_worker, args=(port,), daemon=True)
+                process.start()
+                self.worker_processes.append(process)
+
+        self.log(f"Coordenando {len(addresses)} workers de Source: {addresses}")
+        streams = []
+        for worker_index, (ip, port) in enumerate(addresses):
+            stream = self.connect_worker(ip, port).makefile('rwb')
+            # Cada worker escreve seu próprio log para não truncar o log do coordenador
+            worker_config = dict(self.config, log_file=f"source_worker_{worker_index}.log")
+            if self.config.get("trace_output"):
+                worker_config["trace_output"] = f"{self.config['trace_output']}.worker{worker_index}"
+            send_command(stream, {"cmd": "setup", "config": worker_config,
+                                  "worker_index": worker_index, "num_workers": len(addresses)})
+            streams.append(stream)
+        return streams
+
+    def connect_worker(self, ip: str, port: int, attempts: int = 20) -> socket.socket:
+        # Workers locais podem levar alguns instantes para começar a escutar
+        for attempt in range(attempts):
+            try:
+                sock = socket.create_connection((ip, port), timeout=5.0)
+                sock.settimeout(None) # Um ciclo inteiro pode passar antes da resposta do worker
+                return sock
+            except OSError:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(0.25)
+
+    def stop_workers(self, streams: list) -> None:
+        for stream in streams:
+            try:
+                send_command(stream, {"cmd": "shutdown"})
+                stream.close()
+            except Exception as e:
+                self.log(f"Erro ao encerrar worker de Source: {e}")
+
+        for process in self.worker_processes:
+            process.terminate()
+            process.join(timeout=5.0)
+        self.worker_processes = []
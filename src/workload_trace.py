@@ -0,0 +1,99 @@
+import heapq
+import json
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+# Formato do trace: JSON Lines, um registro por requisição enviada pelo Source:
+#   cycle, index, qts        -> ciclo, índice da mensagem e quantidade de serviços do ciclo
+#   offset_ms                -> instante de chegada relativo ao início do ciclo
+#   lb                       -> load balancer de destino ("ip:porta")
+#   payload_bytes            -> tamanho da mensagem enviada
+#   mrt_ms                   -> tempo de resposta observado (None se a mensagem foi descartada)
+#   hops_ms                  -> latência entre timestamps consecutivos da resposta
+#                               (source -> LB -> serviço -> ... -> source)
+
+
+class TraceWriter:
+    # As respostas chegam fora de ordem, mas o trace precisa ficar na ordem de chegada ao LB para
+    # que o replay possa lê-lo em streaming: cada envio reserva um número de sequência e os registros
+    # concluídos esperam em `completed` até que todos os anteriores tenham sido gravados.
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'w', encoding='utf-8')
+        self.next_sequence: int = 0
+        self.next_to_write: int = 0
+        self.completed: Dict[int, str] = {}
+
+    def reserve(self) -> int:
+        with self.lock:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            return sequence
+
+    def write(self, sequence: int, record: Dict[str, Any]) -> None:
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.completed[sequence] = line
+            while self.next_to_write in self.completed:
+                self.file.write(self.completed.pop(self.next_to_write))
+                self.next_to_write += 1
+            self.file.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            # Registros cujo envio anterior nunca terminou ainda são gravados, na ordem de envio
+            for sequence in sorted(self.completed):
+                self.file.write(self.completed.pop(sequence))
+            self.file.close()
+
+
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    # Lê o trace linha a linha, sem carregá-lo inteiro em memória
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def read_traces(paths: List[str]) -> Iterator[Dict[str, Any]]:
+    # Um Source distribuído grava um trace por worker, cada um já ordenado por chegada;
+    # os arquivos são intercalados em streaming na ordem (ciclo, instante de chegada)
+    return heapq.merge(*(read_trace(path) for path in paths),
+                       key=lambda record: (record["cycle"], record["offset_ms"]))
+
+
+def response_timestamps(response: str) -> List[float]:
+    # A resposta acumula "<ciclo>;<índice>;<t_source>;<t_lb>;<t_serviço>;..." e cada proxy
+    # acrescenta seu timestamp; campos que não são timestamps (ex.: padding) são ignorados
+    timestamps = []
+    for field in response.split(";")[2:]:
+        try:
+            timestamps.append(float(field))
+        except ValueError:
+            continue
+    return timestamps
+
+
+def hop_latencies_ms(response: str, receive_time: float) -> List[float]:
+    timestamps = response_timestamps(response) + [receive_time]
+    return [round((later - earlier) * 1000, 3) for earlier, later in zip(timestamps, timestamps[1:])]
+
+
+def build_trace_record(cycle: int, index: int, qts: int, offset_ms: float, lb_ip: str, lb_port: int,
+                       msg: str, response: Optional[str], mrt: Optional[float]) -> Dict[str, Any]:
+    hops_ms: List[float] = []
+    if response is not None and mrt is not None:
+        sent_timestamp = float(msg.split(";")[-1])
+        hops_ms = hop_latencies_ms(response, sent_timestamp + mrt / 1000.0)
+    return {
+        "cycle": cycle,
+        "index": index,
+        "qts": qts,
+        "offset_ms": round(offset_ms, 3),
+        "lb": f"{lb_ip}:{lb_port}",
+        "payload_bytes": len(msg.encode()),
+        "mrt_ms": round(mrt, 3) if mrt is not None else None,
+        "hops_ms": hops_ms,
+    }